@@ -6,6 +6,10 @@ from typing import Union, Optional, List, Dict, Pattern
 from service.serving_chat import OpenAIServingChat
 from service.chat_protocol import ChatCompletionRequest
 
+# 模块加载时预编译Lua代码块正则，避免每次构造提取器时重复编译
+_USER_LUA_RE: Pattern[str] = re.compile(r"^```lua\n([\s\S]*?)```$")
+_ASSISTANT_LUA_RE: Pattern[str] = re.compile(r"^```lua\n([\s\S]*?)$")
+
 class TextPostProcessor(ABC):
     """文本后处理器接口：定义文本处理逻辑的统一规范"""
     @abstractmethod
@@ -57,9 +61,31 @@ class PromptValidator(ABC):
         """
         pass
 
+    def validate_and_tokenize_batch(
+        self,
+        requests: List[ChatCompletionRequest],
+        prompts: List[str]
+    ) -> List[Union[Optional[List[int]], ValueError]]:
+        """
+        批量验证Prompt并进行Token化处理（逐条调用validate_and_tokenize，子类可覆盖为一次批量Token化）
+        :param requests: 聊天请求对象列表
+        :param prompts: 与requests一一对应的Prompt列表
+        :return: 与requests一一对应的结果；单条验证失败（如超长）时该位置为对应的ValueError，不影响其余请求
+        """
+        results: List[Union[Optional[List[int]], ValueError]] = []
+        for request, prompt in zip(requests, prompts):
+            try:
+                results.append(self.validate_and_tokenize(request, prompt))
+            except ValueError as e:
+                results.append(e)
+        return results
+
 class StripLeftPostProcessor(TextPostProcessor):
     """默认文本后处理器：实现原post_process的左空格清除逻辑"""
     def process(self, text: str) -> str:
+        # 首字符非空白时直接返回，跳过lstrip扫描
+        if not text or not text[0].isspace():
+            return text
         return text.lstrip()
 
 
@@ -67,28 +93,29 @@ class LuaContentExtractor(MessageContentExtractor):
     """Lua代码块提取器：实现原user/assistant的Lua代码块提取逻辑"""
     def __init__(
         self,
-        user_pattern: Pattern[str] = re.compile(r"^```lua\n([\s\S]*?)```$"),
-        assistant_pattern: Pattern[str] = re.compile(r"^```lua\n([\s\S]*?)$")
+        user_pattern: Pattern[str] = _USER_LUA_RE,
+        assistant_pattern: Pattern[str] = _ASSISTANT_LUA_RE
     ):
         """
         初始化Lua提取器，支持自定义正则（提升灵活性，如适配不同代码块格式）
         :param user_pattern: 用户消息的Lua匹配正则
         :param assistant_pattern: 助手消息的Lua匹配正则
         """
-        self.role_patterns: Dict[str, Pattern[str]] = {
-            "user": user_pattern,
-            "assistant": assistant_pattern
-        }
+        self.user_pattern = user_pattern
+        self.assistant_pattern = assistant_pattern
 
     def extract(self, role: str, content: str) -> Optional[str]:
-        # 获取当前角色对应的正则（无匹配角色时返回原始内容）
-        pattern = self.role_patterns.get(role)
-        if not pattern:
+        # 按角色直接分支选择正则（无匹配角色时返回原始内容）
+        if role == "user":
+            pattern = self.user_pattern
+        elif role == "assistant":
+            pattern = self.assistant_pattern
+        else:
             return content
         
-        # 提取匹配内容（原逻辑的findall取第一个结果）
-        match_result = pattern.findall(content)
-        return match_result[0] if match_result else content
+        # 提取首个匹配内容（search命中即停止，避免findall构造完整结果列表）
+        match = pattern.search(content)
+        return match.group(1) if match else content
 
 
 class InstructionPromptTemplate(PromptTemplate):
@@ -103,10 +130,22 @@ class InstructionPromptTemplate(PromptTemplate):
             "Write a response that appropriately completes the request.\n\n"
             "### Instruction:\n{input}\n\n### Response:"
         )
+        # 预先按占位符切分模板（先用哨兵字符format一次，保留"{{"/"}}"转义语义），
+        # render时直接拼接，避免每次请求解析format格式
+        self._segments: Optional[List[str]] = self.template.format(input="\0").split("\0")
+        # 占位符带转换/格式说明（如{input!r}、{input:>5}）时切分结果与format不等价，回退为format
+        probe = "probe input"
+        if (
+            len(self._segments) < 2
+            or probe.join(self._segments) != self.template.format(input=probe)
+        ):
+            self._segments = None
 
     def render(self, input_content: str) -> str:
-        # 替换模板中的占位符，生成最终Prompt
-        return self.template.format(input=input_content)
+        if self._segments is None:
+            return self.template.format(input=input_content)
+        # 将输入内容拼接到预切分的模板片段之间，生成最终Prompt
+        return input_content.join(self._segments)
 
 
 class DefaultPromptValidator(PromptValidator):
@@ -150,8 +189,14 @@ class GameAgent(OpenAIServingChat):
 
     def _format_message(self, message: Dict[str, str]) -> Dict[str, str]:
         """格式化消息：使用注入的提取器处理内容（原逻辑抽象化）"""
-        role = message.get("role", "")
-        original_content = message.get("content", "")
+        try:
+            # 常规路径直接索引
+            role = message["role"]
+            original_content = message["content"]
+        except KeyError:
+            # 字段缺失时回退为空字符串（保留原默认值语义）
+            role = message.get("role", "")
+            original_content = message.get("content", "")
         
         # 调用提取器提取内容（替换原硬编码的正则判断）
         extracted_content = self.content_extractor.extract(role, original_content)
@@ -182,19 +227,20 @@ class GameAgent(OpenAIServingChat):
         return self.prompt_validator.validate_and_tokenize(request, prompt, prompt_ids)
 
 
+# 默认依赖均为无状态对象，模块级单例复用，避免每次创建Agent时重复构造
+_DEFAULT_POST_PROCESSOR = StripLeftPostProcessor()
+_DEFAULT_CONTENT_EXTRACTOR = LuaContentExtractor()
+_DEFAULT_PROMPT_TEMPLATE = InstructionPromptTemplate()
+_DEFAULT_VALIDATOR = DefaultPromptValidator()
+
+
 def create_default_game_agent(*args, **kwargs) -> GameAgent:
     """创建默认配置的GameAgent（保留原有全部逻辑，方便快速使用）"""
-    # 组装默认依赖（与原代码逻辑完全一致）
-    default_post_processor = StripLeftPostProcessor()
-    default_content_extractor = LuaContentExtractor()
-    default_prompt_template = InstructionPromptTemplate()
-    default_validator = DefaultPromptValidator()
-    
     return GameAgent(
-        post_processor=default_post_processor,
-        content_extractor=default_content_extractor,
-        prompt_template=default_prompt_template,
-        prompt_validator=default_validator,
+        post_processor=_DEFAULT_POST_PROCESSOR,
+        content_extractor=_DEFAULT_CONTENT_EXTRACTOR,
+        prompt_template=_DEFAULT_PROMPT_TEMPLATE,
+        prompt_validator=_DEFAULT_VALIDATOR,
         *args,
         **kwargs
     )
\ No newline at end of file
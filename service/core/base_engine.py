@@ -4,20 +4,23 @@
 """
 import time
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, AsyncIterator, Union, Optional, List, Callable
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterator, Union, Optional, List, Callable
 from fastapi import Request
 from http import HTTPStatus
 
-from vllm.engine.async_llm_engine import AsyncLLMEngine
-from vllm.outputs import RequestOutput
 from utils.logger import logger
 from utils.monitor import report_metrics
 
+if TYPE_CHECKING:
+    # vLLM导入链较重（torch/CUDA等），仅用于类型注解，延迟到类型检查时导入
+    from vllm.engine.async_llm_engine import AsyncLLMEngine
+    from vllm.outputs import RequestOutput
+
 
 class BaseServingEngine(ABC):
     """基础服务引擎抽象类"""
     
-    def __init__(self, engine: AsyncLLMEngine, served_model: str, protocol: str = "default", *args, **kwargs):
+    def __init__(self, engine: "AsyncLLMEngine", served_model: str, protocol: str = "default", *args, **kwargs):
         self.engine = engine
         self.served_model = served_model
         self.protocol = protocol
@@ -51,6 +54,20 @@ class BaseServingEngine(ABC):
         speed = 0 if cost_time <= 0 else usage.completion_tokens * 1000 / cost_time
         report_metrics({"request_cost_time": cost_time, "speed": speed}, tags)
 
+    def report_request_finish(self, usage, start_time: float, tags: dict) -> int:
+        """请求结束时单次合并上报token使用量与性能指标（替代report_tokens + report_performance_metrics两次上报）"""
+        cost_time = round((time.perf_counter() - start_time) * 1000)
+        speed = 0 if cost_time <= 0 else usage.completion_tokens * 1000 / cost_time
+        metrics_map = {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            "request_cost_time": cost_time,
+            "speed": speed,
+        }
+        report_metrics(metrics_map, {**tags, "protocol": self.protocol})
+        return cost_time
+
     def report_first_token_metrics(self, start_time: float, tags: dict):
         """报告首包时间指标"""
         first_cost = round((time.perf_counter() - start_time) * 1000)
@@ -68,10 +85,10 @@ class MetricsReporter:
         """报告请求指标"""
         base_tags = {
             "model": request.model,
-            "stream": str(request.stream),
-            "protocol": self.protocol
+            "stream": "True" if request.stream else "False",
+            "protocol": self.protocol,
+            **tags
         }
-        base_tags.update(tags)
         report_metrics({"request_total": 1}, base_tags, ["add"])
     
     def report_success_metrics(self, tags: dict):
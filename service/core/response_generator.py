@@ -3,81 +3,75 @@
 提供高性能的流式和完整响应生成
 """
 import time
-from typing import AsyncGenerator, AsyncIterator, List, Dict, Any
+from typing import TYPE_CHECKING, AsyncGenerator, AsyncIterator, List, Dict, Any
+import orjson
 from fastapi import Request
-from vllm.outputs import RequestOutput
 
 from utils.logger import logger
 from utils.monitor import report_metrics
 
+if TYPE_CHECKING:
+    from vllm.outputs import RequestOutput
+
+# SSE帧的固定字节前后缀
+_DATA_PREFIX = b"data: "
+_SEP = b"\n\n"
+_DONE_FRAME = _DATA_PREFIX + b"[DONE]" + _SEP
+
+# 非流式响应中检查客户端断连的间隔（按result_generator产出次数计）
+_DISCONNECT_POLL_INTERVAL = 16
+
 
 class OptimizedResponseGenerator:
     """优化的响应生成器"""
     
     def __init__(self, protocol: str):
         self.protocol = protocol
-        self._text_cache: Dict[str, str] = {}
-        self._length_cache: Dict[str, int] = {}
-    
-    def get_delta_text(self, output_text: str, previous_text: str, cache_key: str) -> str:
-        """高效计算增量文本"""
-        if cache_key in self._text_cache:
-            cached_text = self._text_cache[cache_key]
-            if cached_text == previous_text:
-                # 使用缓存的长度避免重复切片
-                cached_length = self._length_cache.get(cache_key, 0)
-                return output_text[cached_length:]
-        
-        # 计算增量并缓存
-        delta_text = output_text[len(previous_text):]
-        self._text_cache[cache_key] = previous_text
-        self._length_cache[cache_key] = len(previous_text)
-        
-        return delta_text
-    
-    def clear_cache(self, cache_key: str):
-        """清理缓存"""
-        self._text_cache.pop(cache_key, None)
-        self._length_cache.pop(cache_key, None)
     
     async def generate_stream_response(
         self,
         request,
-        result_generator: AsyncIterator[RequestOutput],
+        result_generator: AsyncIterator["RequestOutput"],
         request_id: str,
         response_creator_func,
         tags: Dict[str, Any]
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         """生成流式响应"""
-        start_time = time.perf_counter()
+        # 热循环内频繁调用的全局函数绑定为局部变量，减少逐token的全局/属性查找
+        _perf = time.perf_counter
+        _round = round
+        _report = report_metrics
+        start_time = _perf()
         
         # 初始化状态数组
         n_choices = getattr(request, 'n', 1)
-        previous_texts = [""] * n_choices
+        prev_lens = [0] * n_choices
         previous_num_tokens = [0] * n_choices
-        finish_reason_sent = [False] * n_choices
-        has_report_first = [False] * n_choices
+        # 各choice的完成/首包上报状态以位图记录（第i位对应index为i的choice）
+        finish_bits = 0
+        first_report_bits = 0
         
         async for res in result_generator:
-            res: RequestOutput
+            res: "RequestOutput"
             for output in res.outputs:
                 i = output.index
                 
-                if finish_reason_sent[i]:
+                bit = 1 << i
+                if finish_bits & bit:
                     continue
                 
-                # 使用优化的增量文本计算
-                cache_key = f"{request_id}_{i}"
-                delta_text = self.get_delta_text(output.text, previous_texts[i], cache_key)
-                previous_texts[i] = output.text
+                # 仅按偏移量切出增量文本，不保留完整的历史输出
+                output_text = output.text
+                delta_text = output_text[prev_lens[i]:]
+                prev_lens[i] = len(output_text)
                 previous_num_tokens[i] = len(output.token_ids)
                 
                 # 报告首包时间
-                if not has_report_first[i] and previous_num_tokens[i] > 0:
-                    has_report_first[i] = True
-                    first_cost = round((time.perf_counter() - start_time) * 1000)
-                    report_metrics({"first_pkg_cost_time": first_cost}, tags)
-                    logger.info(f"{request_id}|response begin, index:{i}, first_cost:{first_cost}")
+                if not first_report_bits & bit and previous_num_tokens[i] > 0:
+                    first_report_bits |= bit
+                    first_cost = _round((_perf() - start_time) * 1000)
+                    _report({"first_pkg_cost_time": first_cost}, tags)
+                    logger.info("%s|response begin, index:%d, first_cost:%d", request_id, i, first_cost)
                 
                 if output.finish_reason is None:
                     # 生成增量响应
@@ -87,7 +81,7 @@ class OptimizedResponseGenerator:
                         delta_text=delta_text,
                         finish_reason=None
                     )
-                    yield f"data: {chunk_data.json(exclude_unset=True)}\n\n"
+                    yield _DATA_PREFIX + orjson.dumps(chunk_data.dict(exclude_unset=True)) + _SEP
                 else:
                     # 生成完成响应
                     prompt_tokens = len(res.prompt_token_ids)
@@ -102,40 +96,42 @@ class OptimizedResponseGenerator:
                     )
                     
                     # 报告性能指标
-                    cost_time = round((time.perf_counter() - start_time) * 1000)
-                    speed = 0 if cost_time <= 0 else final_usage.completion_tokens * 1000 / cost_time
-                    report_metrics({"request_cost_time": cost_time, "speed": speed}, tags)
-                    logger.info(f"{request_id}|Finish stream request, index:{i}, cost_time:{cost_time}, final_usage:{final_usage}, speed:{speed}")
-                    
-                    yield f"data: {chunk_data.json(exclude_unset=True, exclude_none=True)}\n\n"
-                    finish_reason_sent[i] = True
+                    cost_time = _round((_perf() - start_time) * 1000)
+                    speed = self._report_finish_metrics(cost_time, final_usage.completion_tokens, tags)
+                    logger.info(
+                        "%s|Finish stream request, index:%d, cost_time:%d, final_usage:%s, speed:%s",
+                        request_id, i, cost_time, final_usage, speed
+                    )
                     
-                    # 清理缓存
-                    self.clear_cache(cache_key)
+                    yield _DATA_PREFIX + orjson.dumps(chunk_data.dict(exclude_unset=True, exclude_none=True)) + _SEP
+                    finish_bits |= bit
         
         # 发送结束标记
-        yield "data: [DONE]\n\n"
-        cost_time = round((time.perf_counter() - start_time) * 1000)
-        logger.info(f"{request_id}|Finish stream request, cost_time:{cost_time}")
+        yield _DONE_FRAME
+        cost_time = _round((_perf() - start_time) * 1000)
+        logger.info("%s|Finish stream request, cost_time:%d", request_id, cost_time)
     
     async def generate_full_response(
         self,
         request,
         raw_request: Request,
-        result_generator: AsyncIterator[RequestOutput],
+        result_generator: AsyncIterator["RequestOutput"],
         request_id: str,
         response_creator_func,
         tags: Dict[str, Any]
     ):
         """生成完整响应"""
         start_time = time.perf_counter()
-        final_res: RequestOutput = None
+        final_res: "RequestOutput" = None
         
+        # 每_DISCONNECT_POLL_INTERVAL个结果检查一次客户端连接，降低ASGI轮询开销
+        poll_count = 0
         async for res in result_generator:
-            if await raw_request.is_disconnected():
+            if poll_count % _DISCONNECT_POLL_INTERVAL == 0 and await raw_request.is_disconnected():
                 # 处理客户端断开连接
                 await self._handle_client_disconnect(request_id)
                 return self._create_disconnect_error_response(request_id)
+            poll_count += 1
             final_res = res
         
         assert final_res is not None
@@ -145,12 +141,18 @@ class OptimizedResponseGenerator:
         
         # 报告性能指标
         cost_time = round((time.perf_counter() - start_time) * 1000)
-        speed = 0 if cost_time <= 0 else response.usage.completion_tokens * 1000 / cost_time
-        report_metrics({"request_cost_time": cost_time, "speed": speed}, tags)
+        usage = response.usage
+        self._report_finish_metrics(cost_time, usage.completion_tokens, tags)
         
-        logger.info(f"{request_id}|Finish request, cost_time:{cost_time}, usage:{response.usage}")
+        logger.info("%s|Finish request, cost_time:%d, usage:%s", request_id, cost_time, usage)
         return response
     
+    def _report_finish_metrics(self, cost_time: int, completion_tokens: int, tags: Dict[str, Any]) -> float:
+        """请求完成时单次上报耗时与速度（token使用量由BaseServingEngine侧上报，避免重复计数）"""
+        speed = 0 if cost_time <= 0 else completion_tokens * 1000 / cost_time
+        report_metrics({"request_cost_time": cost_time, "speed": speed}, tags)
+        return speed
+    
     def _create_usage_info(self, prompt_tokens: int, completion_tokens: int):
         """创建使用情况信息"""
         from service.chat_protocol import UsageInfo
@@ -163,7 +165,7 @@ class OptimizedResponseGenerator:
     async def _handle_client_disconnect(self, request_id: str):
         """处理客户端断开连接"""
         # 这里应该调用engine.abort，但需要engine实例
-        logger.warning(f"Client disconnected for request {request_id}")
+        logger.warning("Client disconnected for request %s", request_id)
     
     def _create_disconnect_error_response(self, request_id: str):
         """创建断开连接错误响应"""
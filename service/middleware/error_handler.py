@@ -15,6 +15,17 @@ from utils.logger import logger
 from utils.monitor import report_metrics
 
 
+# 按协议类型分发的错误响应构造器
+_ERROR_RESPONSE_BUILDERS = {
+    "custom": lambda message, code, request_id, error_type: CustomErrorResponse(
+        ret_msg=message, ret_code=code, request_id=request_id
+    ),
+    "default": lambda message, code, request_id, error_type: ErrorResponse(
+        message=message, type=error_type, code=code, request_id=request_id
+    ),
+}
+
+
 class ErrorHandlerMiddleware:
     """错误处理中间件"""
     
@@ -26,10 +37,7 @@ class ErrorHandlerMiddleware:
         report_metrics({"request_total": 1}, tags, report_methods, False)
         report_metrics({"request_failure": 1}, tags, report_methods, False)
         
-        # 根据请求路径确定协议类型
-        protocol = "default"
-        if "/generate" in str(request.url):
-            protocol = "custom"
+        protocol = ErrorHandlerMiddleware._resolve_protocol(request)
         
         error_response = ErrorHandlerMiddleware._create_error_response(
             message=str(exc),
@@ -48,9 +56,7 @@ class ErrorHandlerMiddleware:
         report_metrics({"request_total": 1}, tags, report_methods, False)
         report_metrics({"request_failure": 1}, tags, report_methods, False)
         
-        protocol = "default"
-        if "/generate" in str(request.url):
-            protocol = "custom"
+        protocol = ErrorHandlerMiddleware._resolve_protocol(request)
         
         error_response = ErrorHandlerMiddleware._create_error_response(
             message=exc.detail,
@@ -72,9 +78,7 @@ class ErrorHandlerMiddleware:
         report_metrics({"request_total": 1}, tags, report_methods, False)
         report_metrics({"request_failure": 1}, tags, report_methods, False)
         
-        protocol = "default"
-        if "/generate" in str(request.url):
-            protocol = "custom"
+        protocol = ErrorHandlerMiddleware._resolve_protocol(request)
         
         error_response = ErrorHandlerMiddleware._create_error_response(
             message="Internal server error",
@@ -85,6 +89,11 @@ class ErrorHandlerMiddleware:
         
         return JSONResponse(error_response.dict(), status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
     
+    @staticmethod
+    def _resolve_protocol(request: Request) -> str:
+        """根据请求路径确定协议类型（直接使用path，避免重建完整URL字符串；子串匹配兼容root_path挂载前缀）"""
+        return "custom" if "/generate" in request.url.path else "default"
+    
     @staticmethod
     def _create_error_response(
         message: str,
@@ -94,16 +103,5 @@ class ErrorHandlerMiddleware:
         protocol: str = "default"
     ) -> Union[ErrorResponse, CustomErrorResponse]:
         """创建错误响应"""
-        if protocol == "custom":
-            return CustomErrorResponse(
-                ret_msg=message,
-                ret_code=status_code.value,
-                request_id=request_id
-            )
-        else:
-            return ErrorResponse(
-                message=message,
-                type=error_type,
-                code=status_code.value,
-                request_id=request_id
-            )
+        builder = _ERROR_RESPONSE_BUILDERS.get(protocol, _ERROR_RESPONSE_BUILDERS["default"])
+        return builder(message, status_code.value, request_id, error_type)
@@ -8,10 +8,17 @@ cfg_client = None
 class FileConfiger():
     def __init__(self):
         self.cfg_dir = pathlib.Path(os.path.dirname(os.path.abspath(__file__))).parent / "conf"
+        # 配置文件在进程生命周期内视为不变，首次读取后缓存内容（含文件不存在的结果）
+        self._cache = {}
 
     def get_config(self, key: str) -> str:
+        if key in self._cache:
+            return self._cache[key]
         filePath = f"{self.cfg_dir}/{key}.json"
         if not os.path.exists(filePath):
-            return None
-        with open(filePath, "r") as f:
-            return f.read()
+            content = None
+        else:
+            with open(filePath, "r") as f:
+                content = f.read()
+        self._cache[key] = content
+        return content